@@ -0,0 +1,136 @@
+"""
+Helpers shared by the Go2 data_channel examples: Move/StopMove senders and the
+switch to normal motion mode. Module-level caches are shared by every example
+running in the same process.
+"""
+import asyncio
+import functools
+
+from unitree_webrtc_connect.constants import RTC_TOPIC, SPORT_CMD
+
+# Use orjson for response decoding when it's installed (faster); plain json otherwise
+try:
+    from orjson import loads as _json_loads
+except ImportError:
+    from json import loads as _json_loads
+
+# Resolved once so the send helpers don't repeat the constant lookups
+_SPORT_TOPIC = RTC_TOPIC["SPORT_MOD"]
+_MOTION_SWITCHER_TOPIC = RTC_TOPIC["MOTION_SWITCHER"]
+_CMD_MOVE = SPORT_CMD["Move"]
+_CMD_STOP = SPORT_CMD["StopMove"]
+
+# Prebuilt request payloads (publish_request_new only reads them, so they can be shared)
+_STOP_PAYLOAD = {"api_id": _CMD_STOP}
+_MODE_PROBE_PAYLOAD = {"api_id": 1001}
+_MODE_NORMAL_PAYLOAD = {"api_id": 1002, "parameter": {"name": "normal"}}
+
+# Last-known motion mode per connection, so repeat calls skip the round-trips
+_mode_cache = {}
+# Re-poll MOTION_SWITCHER with doubling delays (first, cap) until the switch lands or times out
+MODE_POLL_INITIAL = 0.1
+MODE_POLL_MAX = 0.8
+MODE_SWITCH_TIMEOUT = 5.0
+
+# On shutdown: how long to let queued sends finish, then how long to wait for the final stop
+DRAIN_TIMEOUT = 0.5
+FINAL_STOP_TIMEOUT = 1.0
+
+# Whether the last Move per connection had any non-zero velocity, so stop() can skip no-op sends
+_is_moving = {}
+
+
+@functools.lru_cache(maxsize=64)
+def _move_payload(x, y, z):
+    return {"api_id": _CMD_MOVE, "parameter": {"x": x, "y": y, "z": z}}
+
+
+async def sport_cmd(conn, payload):
+    await conn.datachannel.pub_sub.publish_request_new(
+        _SPORT_TOPIC,
+        payload,
+    )
+
+
+async def move(conn, x, y, z=0):
+    _is_moving[id(conn)] = bool(x or y or z)
+    await conn.datachannel.pub_sub.publish_request_new(
+        _SPORT_TOPIC,
+        _move_payload(round(x, 3), round(y, 3), round(z, 3)),
+    )
+
+
+async def stop(conn, force=False):
+    """StopMove; skipped if the robot is known to be stationary unless force is set."""
+    if not force and not _is_moving.get(id(conn), True):
+        return
+    _is_moving[id(conn)] = False
+    await conn.datachannel.pub_sub.publish_request_new(
+        _SPORT_TOPIC,
+        _STOP_PAYLOAD,
+    )
+
+
+async def get_motion_mode(conn):
+    """Query MOTION_SWITCHER; return the current mode name or None."""
+    response = await conn.datachannel.pub_sub.publish_request_new(
+        _MOTION_SWITCHER_TOPIC,
+        _MODE_PROBE_PAYLOAD,
+    )
+    if response.get("data", {}).get("header", {}).get("status", {}).get("code") == 0:
+        data = _json_loads(response["data"]["data"])
+        return data.get("name")
+    return None
+
+
+async def wait_for_mode(conn, name, timeout):
+    """Poll MOTION_SWITCHER with exponential back-off until it reports `name`; None on timeout."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    delay = MODE_POLL_INITIAL
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return None
+        await asyncio.sleep(min(delay, remaining))
+        # Shielded: a probe that outlives the deadline is abandoned, not cancelled,
+        # so its late reply still resolves its future normally.
+        probe = asyncio.ensure_future(get_motion_mode(conn))
+        try:
+            mode = await asyncio.wait_for(asyncio.shield(probe), timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            return None
+        if mode == name:
+            return mode
+        delay = min(delay * 2, MODE_POLL_MAX)
+
+
+async def ensure_normal_mode(conn):
+    """Switch to normal mode (required for Move) and wait until the robot reports it."""
+    if _mode_cache.get(id(conn)) == "normal":
+        return
+    # Probe and switch together; switching to normal when already normal is harmless.
+    mode, _ = await asyncio.gather(
+        get_motion_mode(conn),
+        conn.datachannel.pub_sub.publish_request_new(
+            _MOTION_SWITCHER_TOPIC,
+            _MODE_NORMAL_PAYLOAD,
+        ),
+    )
+    if mode != "normal":
+        mode = await wait_for_mode(conn, "normal", MODE_SWITCH_TIMEOUT)
+        if mode is None:
+            print("Robot did not confirm normal mode in time; continuing anyway.")
+            return
+    _mode_cache[id(conn)] = mode
+
+
+async def drain_and_stop(conn, pending, holds=()):
+    """Cancel idle `holds` (e.g. a timed turn), give in-flight sends a moment, then force a stop."""
+    # Sends are left running: their message is already queued, and cancelling breaks the late reply
+    for t in list(holds):
+        t.cancel()
+    pending = [t for t in pending if not t.done()]
+    if pending:
+        await asyncio.wait(pending, timeout=DRAIN_TIMEOUT)
+    await asyncio.wait_for(stop(conn, force=True), timeout=FINAL_STOP_TIMEOUT)
@@ -3,12 +3,16 @@ Go2 does the Cha Cha Slide: a sequence of moves (slide left, slide right, criss
 Edit ROBOT_IP below and run from repo root.
 """
 import asyncio
-import json
 import logging
+import os
 import sys
 
 from unitree_webrtc_connect.webrtc_driver import UnitreeWebRTCConnection, WebRTCConnectionMethod
-from unitree_webrtc_connect.constants import RTC_TOPIC, SPORT_CMD
+from unitree_webrtc_connect.constants import SPORT_CMD
+
+# Shared helpers live one directory up, in data_channel/_common.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from _common import drain_and_stop, ensure_normal_mode, move, sport_cmd, stop  # noqa: E402
 
 logging.basicConfig(level=logging.FATAL)
 
@@ -26,74 +30,82 @@ TURN_Z = 0.5    # yaw rate for "turn it out"
 TURN_360_DURATION = 14.0   # ~2*pi/0.5 sec to turn 360°
 
 
-async def move(conn, x, y, z=0):
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["Move"], "parameter": {"x": x, "y": y, "z": z}},
-    )
+# Dance-only sport commands
+_CMD_BOUND = SPORT_CMD["Bound"]
+_CMD_WIGGLE = SPORT_CMD["WiggleHips"]
+_BOUND_PAYLOAD = {"api_id": _CMD_BOUND, "parameter": {"data": True}}
+_WIGGLE_PAYLOAD = {"api_id": _CMD_WIGGLE, "parameter": {"data": True}}
 
 
-async def stop(conn):
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["StopMove"]},
-    )
+def _step(label, send):
+    """Wrap a send coroutine as a schedule action that prints its cue first."""
+    async def action(conn):
+        if label:
+            print(label)
+        await send(conn)
+    return action
 
 
-async def run_cha_cha_slide(conn):
-    """Sequence: to the left, take it back, one hop, right foot stomp, left foot stomp, cha cha, turn it out."""
-    # To the left
-    print("To the left!")
-    await move(conn, 0, STEP_Y)
-    await asyncio.sleep(BEAT * 2)
-    await stop(conn)
-    await asyncio.sleep(PAUSE)
+def _build_schedule():
+    """Return ([(offset_s, action), ...], total_duration) for one round of the dance."""
+    schedule = []
+    t = 0.0
 
-    # Take it back
-    print("Take it back!")
-    await move(conn, -STEP_X, 0)
-    await asyncio.sleep(BEAT * 2)
-    await stop(conn)
-    await asyncio.sleep(PAUSE)
-
-    # One hop (Bound = in-place bounce; no forward motion)
-    print("One hop!")
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["Bound"], "parameter": {"data": True}},
-    )
-    await asyncio.sleep(1.5)  # time to land
-    await asyncio.sleep(PAUSE)
+    def at(label, send, hold):
+        nonlocal t
+        schedule.append((t, _step(label, send)))
+        t += hold
 
+    # To the left
+    at("To the left!", lambda conn: move(conn, 0, STEP_Y), BEAT * 2)
+    at(None, stop, PAUSE)
+    # Take it back
+    at("Take it back!", lambda conn: move(conn, -STEP_X, 0), BEAT * 2)
+    at(None, stop, PAUSE)
+    # One hop (Bound = in-place bounce; no forward motion), 1.5 s to land
+    at("One hop!", lambda conn: sport_cmd(conn, _BOUND_PAYLOAD), 1.5 + PAUSE)
     # Right foot stomp
-    print("Right foot stomp!")
-    await move(conn, 0, -STOMP_Y)
-    await asyncio.sleep(BEAT)
-    await stop(conn)
-    await asyncio.sleep(PAUSE)
-
+    at("Right foot stomp!", lambda conn: move(conn, 0, -STOMP_Y), BEAT)
+    at(None, stop, PAUSE)
     # Left foot stomp
-    print("Left foot stomp!")
-    await move(conn, 0, STOMP_Y)
-    await asyncio.sleep(BEAT)
-    await stop(conn)
-    await asyncio.sleep(PAUSE)
-
+    at("Left foot stomp!", lambda conn: move(conn, 0, STOMP_Y), BEAT)
+    at(None, stop, PAUSE)
     # Cha cha (WiggleHips)
-    print("Cha cha!")
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["WiggleHips"], "parameter": {"data": True}},
-    )
-    await asyncio.sleep(2.0)
-    await asyncio.sleep(PAUSE)
-
+    at("Cha cha!", lambda conn: sport_cmd(conn, _WIGGLE_PAYLOAD), 2.0 + PAUSE)
     # Turn it out (360° – hold yaw rate long enough for one full spin)
-    print("Turn it out!")
-    await move(conn, 0, 0, TURN_Z)
-    await asyncio.sleep(TURN_360_DURATION)
-    await stop(conn)
-    await asyncio.sleep(PAUSE)
+    at("Turn it out!", lambda conn: move(conn, 0, 0, TURN_Z), TURN_360_DURATION)
+    at(None, stop, PAUSE)
+    return schedule, t
+
+
+# Step tasks still in flight, drained before the final stop on shutdown
+_pending = set()
+
+# Precomputed once: every step is anchored to the round start, so send latency doesn't drift the dance
+CHA_CHA_SCHEDULE, CHA_CHA_DURATION = _build_schedule()
+
+
+async def run_cha_cha_slide(conn):
+    """Sequence: to the left, take it back, one hop, right foot stomp, left foot stomp, cha cha, turn it out."""
+    loop = asyncio.get_running_loop()
+    tasks = []
+
+    def fire(action):
+        task = asyncio.create_task(action(conn))
+        tasks.append(task)
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+
+    t0 = loop.time()
+    handles = [loop.call_at(t0 + offset, fire, action) for offset, action in CHA_CHA_SCHEDULE]
+    try:
+        await asyncio.sleep(CHA_CHA_DURATION)
+    finally:
+        # If interrupted, don't let steps that haven't fired yet race the shutdown stop
+        for h in handles:
+            h.cancel()
+    # Surface any send errors from the scheduled steps
+    await asyncio.gather(*tasks)
 
 
 async def main():
@@ -105,19 +117,7 @@ async def main():
 
         # Normal mode (required for Move)
         print("Setting motion mode to normal...")
-        response = await conn.datachannel.pub_sub.publish_request_new(
-            RTC_TOPIC["MOTION_SWITCHER"],
-            {"api_id": 1001},
-        )
-        if response.get("data", {}).get("header", {}).get("status", {}).get("code") == 0:
-            data = json.loads(response["data"]["data"])
-            current = data.get("name", "?")
-            if current != "normal":
-                await conn.datachannel.pub_sub.publish_request_new(
-                    RTC_TOPIC["MOTION_SWITCHER"],
-                    {"api_id": 1002, "parameter": {"name": "normal"}},
-                )
-                await asyncio.sleep(5)
+        await ensure_normal_mode(conn)
 
         print("Cha Cha Slide starting in 2 seconds...")
         await asyncio.sleep(2)
@@ -127,7 +127,6 @@ async def main():
             print(f"--- Round {i + 1}/4 ---")
             await run_cha_cha_slide(conn)
 
-        await stop(conn)
         print("Done! Cha Cha Slide complete.")
 
     except ValueError as e:
@@ -135,10 +134,7 @@ async def main():
     finally:
         if conn is not None:
             try:
-                await conn.datachannel.pub_sub.publish_request_new(
-                    RTC_TOPIC["SPORT_MOD"],
-                    {"api_id": SPORT_CMD["StopMove"]},
-                )
+                await drain_and_stop(conn, _pending)
             except Exception:
                 pass
 
@@ -3,13 +3,17 @@ Control the Go2 with WASD keys. No Enter needed — each keypress moves or stops
 Edit ROBOT_IP below and run from repo root. Requires Unix/macOS for key input.
 """
 import asyncio
-import json
 import logging
 import os
 import sys
+import time
 
 from unitree_webrtc_connect.webrtc_driver import UnitreeWebRTCConnection, WebRTCConnectionMethod
-from unitree_webrtc_connect.constants import RTC_TOPIC, SPORT_CMD
+from unitree_webrtc_connect.constants import SPORT_CMD
+
+# Shared helpers live one directory up, in data_channel/_common.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from _common import drain_and_stop, ensure_normal_mode, move, sport_cmd, stop  # noqa: E402
 
 logging.basicConfig(level=logging.FATAL)
 
@@ -22,6 +26,12 @@ SPEED_Y = 0.35
 # Turn test: Move(0,0,z) = yaw rate (rad/s). Higher = faster spin. X to stop early.
 TURN_Z = 1.2
 TURN_DURATION = 6.0
+# Identical Move commands within this window are dropped (key autorepeat)
+REPEAT_WINDOW = 0.05
+# At most this many key commands in flight; new ones are dropped until one finishes
+MAX_PENDING = 2
+# A command still unanswered after this many seconds stops holding its slot (it isn't cancelled)
+SLOT_TIMEOUT = 1.0
 
 # Single-key reading on Unix/macOS
 try:
@@ -36,7 +46,7 @@ _old_termios = None
 
 
 def stdin_setup():
-    """Put stdin in cbreak so we get one key per read. Call once at start."""
+    """Put stdin in cbreak so keys arrive without Enter. Call once at start."""
     global _stdin_fd, _old_termios
     if not _HAVE_TERMIOS or not sys.stdin.isatty():
         return False
@@ -51,71 +61,140 @@ def stdin_restore():
     global _old_termios
     if _HAVE_TERMIOS and _stdin_fd is not None and _old_termios is not None:
         termios.tcsetattr(_stdin_fd, termios.TCSADRAIN, _old_termios)
+        # The async pipe reader leaves stdin non-blocking; the shell expects blocking
+        os.set_blocking(_stdin_fd, True)
 
 
-def read_key():
-    """Read one keypress; return bytes or None."""
-    if not _HAVE_TERMIOS or _stdin_fd is None:
-        return None
-    try:
-        return os.read(_stdin_fd, 1)
-    except (BlockingIOError, OSError):
-        return None
+async def open_key_reader():
+    """Attach an asyncio StreamReader to stdin. Returns (reader, transport)."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    protocol = asyncio.StreamReaderProtocol(reader)
+    # Read from a dup so closing the transport doesn't close the real stdin
+    pipe = os.fdopen(os.dup(_stdin_fd), "rb", buffering=0)
+    transport, _ = await loop.connect_read_pipe(lambda: protocol, pipe)
+    return reader, transport
+
+
+# Key-triggered sport commands
+_CMD_FRONTJUMP = SPORT_CMD["FrontJump"]
+_CMD_MOONWALK = SPORT_CMD["MoonWalk"]
+_CMD_DANCE1 = SPORT_CMD["Dance1"]
+_CMD_DANCE2 = SPORT_CMD["Dance2"]
+_FRONT_JUMP_PAYLOAD = {"api_id": _CMD_FRONTJUMP, "parameter": {"data": True}}
+_MOONWALK_PAYLOAD = {"api_id": _CMD_MOONWALK, "parameter": {"data": True}}
+_DANCE1_PAYLOAD = {"api_id": _CMD_DANCE1, "parameter": {"data": True}}
+_DANCE2_PAYLOAD = {"api_id": _CMD_DANCE2, "parameter": {"data": True}}
+
+
+_last_cmd = None
+_last_sent_ts = 0.0
+
+
+def is_repeat_move(args):
+    """True if the same Move args were scheduled within REPEAT_WINDOW."""
+    return args == _last_cmd and time.monotonic() - _last_sent_ts < REPEAT_WINDOW
+
+
+def note_move(args):
+    """Remember the Move args just scheduled, for is_repeat_move()."""
+    global _last_cmd, _last_sent_ts
+    _last_cmd = args
+    _last_sent_ts = time.monotonic()
 
 
-async def move(conn, x, y, z=0):
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["Move"], "parameter": {"x": x, "y": y, "z": z}},
-    )
+def reset_last_cmd():
+    """Forget the last Move so the next one is always sent."""
+    global _last_cmd
+    _last_cmd = None
 
 
-async def stop(conn):
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["StopMove"]},
-    )
+# In-flight key command tasks -> time their MAX_PENDING slot expires (None if unbounded)
+_pending = {}
+
+
+def _on_send_done(task):
+    _pending.pop(task, None)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Command failed: {task.exception()}", flush=True)
+
+
+def spawn(fn, *args):
+    """Schedule fn(*args); returns the task, or None if MAX_PENDING are already in flight."""
+    # Never cancel a started send (its message is already queued); only refuse new ones
+    now = time.monotonic()
+    bounded = fn not in _UNBOUNDED
+    if bounded and sum(1 for t, exp in _pending.items() if exp and exp > now and not t.done()) >= MAX_PENDING:
+        print(f"Busy, dropped {fn.__name__}", flush=True)
+        return None
+    task = asyncio.create_task(fn(*args))
+    _pending[task] = now + SLOT_TIMEOUT if bounded else None
+    task.add_done_callback(_on_send_done)
+    return task
 
 
 async def hop(conn):
     """Jump forward (FrontJump). API also has FrontPounce 1032 / Bound 1304 if you want to try in-place."""
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["FrontJump"], "parameter": {"data": True}},
-    )
+    print("Hop!", flush=True)
+    await sport_cmd(conn, _FRONT_JUMP_PAYLOAD)
 
 
 async def moonwalk(conn):
     """MoonWalk (sport API)."""
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["MoonWalk"], "parameter": {"data": True}},
-    )
+    await sport_cmd(conn, _MOONWALK_PAYLOAD)
 
 
 async def dance1(conn):
     """Dance1 (sport API)."""
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["Dance1"], "parameter": {"data": True}},
-    )
+    await sport_cmd(conn, _DANCE1_PAYLOAD)
 
 
 async def dance2(conn):
     """Dance2 (sport API)."""
-    await conn.datachannel.pub_sub.publish_request_new(
-        RTC_TOPIC["SPORT_MOD"],
-        {"api_id": SPORT_CMD["Dance2"], "parameter": {"data": True}},
-    )
+    await sport_cmd(conn, _DANCE2_PAYLOAD)
+
+
+# Turn-test tasks currently sleeping through their hold (no send in flight)
+_turn_holds = set()
 
 
 async def turn_test(conn):
     """Turn: Move(0, 0, TURN_Z) for TURN_DURATION. On this API it may only shift; press X to stop."""
+    loop = asyncio.get_running_loop()
+    # Deadline set before the send, so publish latency comes out of the hold time
+    t_end = loop.time() + TURN_DURATION
     await move(conn, 0, 0, TURN_Z)
-    await asyncio.sleep(TURN_DURATION)
+    # Registered while holding so shutdown can cancel the wait and send its forced stop instead
+    task = asyncio.current_task()
+    _turn_holds.add(task)
+    try:
+        await asyncio.sleep(max(0.0, t_end - loop.time()))
+    finally:
+        _turn_holds.discard(task)
     await stop(conn)
 
 
+# Key -> (command coroutine function, extra args after conn); looked up by raw byte, either case
+_KEY_COMMANDS = {
+    "w": (move, (SPEED_X, 0)),
+    "s": (move, (-SPEED_X, 0)),
+    "a": (move, (0, SPEED_Y)),
+    "d": (move, (0, -SPEED_Y)),
+    " ": (hop, ()),
+    "x": (stop, (True,)),  # force: always send an explicit stop
+    "p": (moonwalk, ()),
+    "1": (dance1, ()),
+    "2": (dance2, ()),
+    "t": (turn_test, ()),
+}
+_DISPATCH = {ord(c): entry for k, entry in _KEY_COMMANDS.items() for c in {k, k.upper()}}
+# Exempt from MAX_PENDING: stops must always go out, and the turn test holds its task for seconds
+_UNBOUNDED = {stop, turn_test}
+_QUIT_KEYS = {ord("q"), ord("Q")}
+# Keys after which the next WASD Move must be sent even if it repeats the last one
+_RESET_KEYS = _QUIT_KEYS | {ord(" "), ord("x"), ord("X")}
+
+
 async def main():
     if not _HAVE_TERMIOS:
         print("Keyboard control requires Unix/macOS (termios). Run on Mac/Linux.")
@@ -128,18 +207,7 @@ async def main():
         await conn.connect()
 
         print("Setting motion mode to normal...")
-        response = await conn.datachannel.pub_sub.publish_request_new(
-            RTC_TOPIC["MOTION_SWITCHER"],
-            {"api_id": 1001},
-        )
-        if response.get("data", {}).get("header", {}).get("status", {}).get("code") == 0:
-            data = json.loads(response["data"]["data"])
-            if data.get("name") != "normal":
-                await conn.datachannel.pub_sub.publish_request_new(
-                    RTC_TOPIC["MOTION_SWITCHER"],
-                    {"api_id": 1002, "parameter": {"name": "normal"}},
-                )
-                await asyncio.sleep(5)
+        await ensure_normal_mode(conn)
 
         print("WASD: move  |  Space: hop  |  P: moonwalk  |  1/2: dance1/dance2  |  T: turn test  |  X: stop  |  Q: quit")
         print("(No Enter — just press keys)")
@@ -148,52 +216,37 @@ async def main():
             print("Could not set up terminal for key input.")
             return
 
-        loop = asyncio.get_running_loop()
-        quit_event = asyncio.Event()
-
-        def on_key():
-            key = read_key()
-            if key is None:
-                return
-            k = key.decode("utf-8", errors="ignore").lower() if key else ""
-            # Space can come through as b' ' or as " " after decode
-            is_space = k == " " or key == b" "
-            if k == "q":
-                quit_event.set()
-                return
-            if is_space:
-                print("Hop!", flush=True)
-                asyncio.create_task(hop(conn))
-                return
-            if k == "x":
-                asyncio.create_task(stop(conn))
-                return
-            if k == "p":
-                asyncio.create_task(moonwalk(conn))
-                return
-            if k == "1":
-                asyncio.create_task(dance1(conn))
-                return
-            if k == "2":
-                asyncio.create_task(dance2(conn))
-                return
-            if k == "t":
-                asyncio.create_task(turn_test(conn))
-                return
-            if k == "w":
-                asyncio.create_task(move(conn, SPEED_X, 0))
-            elif k == "s":
-                asyncio.create_task(move(conn, -SPEED_X, 0))
-            elif k == "a":
-                asyncio.create_task(move(conn, 0, SPEED_Y))
-            elif k == "d":
-                asyncio.create_task(move(conn, 0, -SPEED_Y))
-
-        loop.add_reader(sys.stdin.fileno(), on_key)
+        def dispatch(data):
+            """Act on a batch of key bytes. Returns False once Q is pressed."""
+            # Autorepeat/paste can deliver a burst; runs of the same key act once
+            prev = None
+            for b in data:
+                if b == prev:
+                    continue
+                prev = b
+                if b in _RESET_KEYS:
+                    reset_last_cmd()
+                if b in _QUIT_KEYS:
+                    return False
+                entry = _DISPATCH.get(b)
+                if entry is None:
+                    continue
+                fn, args = entry
+                # Drop autorepeat duplicates before they cost a task
+                if fn is move and is_repeat_move(args):
+                    continue
+                if spawn(fn, conn, *args) is not None and fn is move:
+                    note_move(args)
+            return True
+
+        reader, transport = await open_key_reader()
         try:
-            await quit_event.wait()
+            while True:
+                data = await reader.read(64)
+                if not data or not dispatch(data):
+                    break
         finally:
-            loop.remove_reader(sys.stdin.fileno())
+            transport.close()
 
     except ValueError as e:
         logging.error(f"Error: {e}")
@@ -201,7 +254,7 @@ async def main():
         stdin_restore()
         if conn is not None:
             try:
-                await stop(conn)
+                await drain_and_stop(conn, _pending, holds=_turn_holds)
             except Exception:
                 pass
         print("Bye.")